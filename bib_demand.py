@@ -10,7 +10,21 @@ neighboring rights to bib_demand.py.
 """
 
 
+import operator
+import os
 import re
+import sys
+
+
+# A RIS line starts with a two letter tag, followed by two spaces and a dash.
+_RIS_TAG = re.compile(r'^(\S\S)  -(.*)', re.MULTILINE)
+
+# The fields of a TRiCAT export we are interested in. The match ends where
+# the value of the field begins.
+_TRICAT_FIELD = re.compile(r'\s*(Jahr|Haupttitel|Titelzusatz|1\. Person)(?:/Fam\.)?')
+
+# Years are sometimes given as '[2018]'; the brackets are removed in one go.
+_YEAR_BRACKETS = str.maketrans('', '', '[]')
 
 
 class InvalidDataTypeError(ValueError):
@@ -18,30 +32,41 @@ class InvalidDataTypeError(ValueError):
 
 
 class LitItem:
+    # Only the normalized fields are kept, the parsed raw data is thrown away
+    # after __init__. This keeps large bibliographies small in memory.
+    __slots__ = ('_title', '_year', '_author', '_key', '_hash')
+
     def __init__(self, data, data_type='ris'):
         if data_type == 'ris':
-            self.data = self.__extract_ris(data)
+            data = self.__extract_ris(data)
         elif data_type == 'tricat':
-            self.data = self.__extract_tricat(data)
+            data = self.__extract_tricat(data)
         else:
             raise InvalidDataTypeError("I don't know how to parse data_type: {}".format(data_type))
+        author = data.get('A1') or ''
+        if not author.strip():
+            author = data.get('A2', 'kein Autor')
+        self.__set_fields(data.get('T1', 'kein Titel'), data.get('PY'), author)
+
+    @classmethod
+    def from_tricat(cls, author=None, title=None, subtitle=None, year=None):
+        """Create a LitItem directly from the fields of a TRiCAT entry,
+        without building an intermediate dictionary first.
+        """
+        item = cls.__new__(cls)
+        if not author or not author.strip():
+            author = 'kein Autor'
+        item.__set_fields(' '.join([title or '', subtitle or '']), year, author)
+        return item
 
     def get_title(self):
-        return self.data.get('T1', 'kein Titel').replace('\n', ' ').strip()
+        return self._title
 
     def get_year(self):
-        year = self.data.get('PY', 'kein Jahr')
-        if not year:
-            year = 'kein Jahr'
-        else:
-            year = year.replace('[', '').replace(']', '').strip()
-        return year
+        return self._year
 
     def get_author(self):
-        author = self.data.get('A1', '').replace('\n', ' ').strip()
-        if not author:
-            author = self.data.get('A2', 'kein Autor').replace('\n', ' ').strip()
-        return author
+        return self._author
 
     def get_relevant(self):
         return {
@@ -51,11 +76,31 @@ class LitItem:
         }
 
     def __eq__(self, other):
-        return (self.get_title() == other.get_title() and self.get_year() == other.get_year())
+        # Different hashes can never be equal, which rejects most items cheaply.
+        return self._hash == other._hash and self._key == other._key
+
+    def __hash__(self):
+        return self._hash
 
     def __str__(self):
         return '{}\n{}\n{}\n'.format(self.get_author(), self.get_title(), self.get_year())
 
+    def __set_fields(self, title, year, author):
+        # The relevant fields are needed over and over again for comparing,
+        # sorting and printing, so we normalize them only once.
+        # Interning lets equal titles and years of duplicates share one string,
+        # so comparing them is a pointer comparison.
+        self._title = sys.intern(title.replace('\n', ' ').strip())
+        if not year:
+            self._year = 'kein Jahr'
+        else:
+            self._year = sys.intern(year.translate(_YEAR_BRACKETS).strip())
+        self._author = author.replace('\n', ' ').strip()
+        # Title and year identify an item. Sets of these plain tuples are
+        # compared by the interpreter without calling back into __eq__.
+        self._key = (self._title, self._year)
+        self._hash = hash(self._key)
+
     def __extract_tricat(self, data):
         """Tricate provides a plain text file when exporting bibliography search results.
         We need a dictionary with relevant data to create a LitItem.
@@ -68,25 +113,19 @@ class LitItem:
 
     def __extract_ris(self, data):
         d = {}
-        current_datum = ''
-        current_key = ''
-        pattern = re.compile('(\S\S)\s\s-(.*)')
-        for line in data.split('\n'):
-            m = re.match(pattern, line)
-            # A match means that we are at the beginning of a section.
-            if m:
-                # Save previous section
-                if current_key:
-                    d[current_key] = current_datum
-                # Now start the new section
-                current_key = m.groups()[0]
-                current_datum = m.groups()[1]
-            else:
-                # No match means we just expand the previous section with the complete current line.
-                current_datum += '\n'
-                current_datum += line
+        # Every match marks the beginning of a section. Everything up to the
+        # next match belongs to the same section, so we only need to remember
+        # where the current value started.
+        key = None
+        start = 0
+        for m in _RIS_TAG.finditer(data):
+            if key is not None:
+                # Drop the line break in front of the next section.
+                d[key] = data[start:m.start() - 1]
+            key, start = m.group(1), m.start(2)
         # The last section still has to be saved.
-        d[current_key] = current_datum
+        if key is not None:
+            d[key] = data[start:]
         return d
 
 
@@ -123,117 +162,131 @@ class Bibliography:
             all_lines = f.readlines()
             line_count = len(all_lines)
             line_number = 0
-            current_data = {}
+            author = title = subtitle = year = None
 
             while line_number < line_count:
                 line = all_lines[line_number]
+                m = _TRICAT_FIELD.match(line)
+                field = m.group(1) if m else None
 
-                if line.lstrip().startswith('Jahr'):
-                    current_data['year'] = line.replace('Jahr', '', 1).strip()
+                if field == 'Jahr':
+                    year = line[m.end():].strip()
                     line_number += 1
-                elif line.lstrip().startswith('Haupttitel'):
-                    data, offset = self.__accumulate_tricat_lines(all_lines, line_number)
-                    current_data['title'] = data
+                elif field == 'Haupttitel':
+                    title, offset = self.__accumulate_tricat_lines(all_lines, line_number, m.end())
                     line_number += offset
-                elif line.lstrip().startswith('Titelzusatz'):
-                    data, offset = self.__accumulate_tricat_lines(all_lines, line_number)
-                    current_data['subtitle'] = data
+                elif field == 'Titelzusatz':
+                    subtitle, offset = self.__accumulate_tricat_lines(all_lines, line_number, m.end())
                     line_number += offset
-                elif line.lstrip().startswith('1. Person'):
+                elif field == '1. Person':
                     # Whenever we hit on '1. Person' we know that a new item starts.
                     # So we commit the data we currently have and start a new item.
-                    if current_data:
-                        items.append(LitItem(current_data, data_type='tricat'))
-                        current_data = {}
-                    data, offset = self.__accumulate_tricat_lines(all_lines, line_number)
-                    current_data['author'] = data
+                    if any(value is not None for value in (author, title, subtitle, year)):
+                        items.append(LitItem.from_tricat(author, title, subtitle, year))
+                        author = title = subtitle = year = None
+                    author, offset = self.__accumulate_tricat_lines(all_lines, line_number, m.end())
                     line_number += offset
                 else:
                     line_number += 1
 
             # Commit the last entry
-            items.append(LitItem(current_data, data_type='tricat'))
+            if any(value is not None for value in (author, title, subtitle, year)):
+                items.append(LitItem.from_tricat(author, title, subtitle, year))
 
         return items
 
-    def __accumulate_tricat_lines(self, lines, line_number):
+    def __accumulate_tricat_lines(self, lines, line_number, label_end):
         """From the starting line, add all further lines until we hit an empty line
-        or the end of the file. Return the combined data as string and the number
+        or the end of the file. The field label on the starting line ends at
+        label_end and is left out. Return the combined data as string and the number
         of lines we combined.
         """
-        data = []
+        data = [lines[line_number][label_end:].strip()]
         count = len(lines)
-        while lines[line_number].strip() and line_number < count:
-            line = lines[line_number]
-            if line.lstrip().startswith('Haupttitel'):
-                line = line.replace('Haupttitel', '', 1)
-            elif line.lstrip().startswith('Titelzusatz'):
-                line = line.replace('Titelzusatz', '', 1)
-            elif line.lstrip().startswith('1. Person'):
-                line = line.replace('1. Person/Fam.', '')
-            line = line.strip()
-            line = line.replace('\n', '')
+        start = line_number
+        line_number += 1
+        while line_number < count:
+            line = lines[line_number].strip()
+            if not line:
+                break
             data.append(line)
             line_number += 1
-        return (' '.join(data), len(data))
+        return (' '.join(data), line_number - start)
 
 
     def __read_ris_file(self, filepath):
+        """Ris entries are separated by empty lines. We read the file line by line
+        and create a LitItem as soon as an entry is complete.
+        """
+        items = []
+        section = []
+
         with open(filepath, encoding='utf-8') as f:
-            data = f.read()
-            sections = self.__split_ris(data)
-            items = [LitItem(section) for section in sections]
-            return items
+            for line in f:
+                if line == '\n':
+                    # Several empty lines in a row must not produce empty items.
+                    if section:
+                        items.append(LitItem(''.join(section)))
+                        section.clear()
+                else:
+                    section.append(line)
 
-    def __split_ris(self, data):
-        """data is a long string of ris entries. We need to split on empty lines."""
-        return data.split('\n\n')
+        # Commit the last entry
+        if section:
+            items.append(LitItem(''.join(section)))
+
+        return items
 
     def intersect(self, other):
         """Build the intersection of two Bibliographies."""
+        other_keys = {item._key for item in other.items}
         intersection = Bibliography()
-        intersection.items = [item for item in self.items if item in other.items]
+        intersection.items = [item for item in self.items if item._key in other_keys]
         return intersection
     
     def difference(self, other):
         """Build a Bibliography with the difference of items."""
+        other_keys = {item._key for item in other.items}
         difference = Bibliography()
-        difference.items = [item for item in self.items if item not in other.items]
+        difference.items = [item for item in self.items if item._key not in other_keys]
         return difference
     
     def unique(self):
         """Build a new Bibliography without duplicate items."""
-        unique = []
-        for item in self.items:
-            if item not in unique:
-                unique.append(item)
+        # Dicts keep insertion order, so the first of several equal items wins.
         bib = Bibliography()
-        bib.items = unique
+        bib.items = list(dict.fromkeys(self.items))
         return bib
     
     def order_by(self, attr='title'):
-        if attr == 'title':
-            sorted_items = sorted(self.items, key=lambda item: item.get_title())
-        elif attr == 'author':
-            sorted_items = sorted(self.items, key=lambda item: item.get_author())
-        elif attr == 'year':
-            sorted_items = sorted(self.items, key=lambda item: item.get_year())
-        else:
-            raise ValueError('{} is not a valid attr argument.'.format(attr))
+        sorted_items = sorted(self.items, key=self.__key_for(attr))
         bib = Bibliography()
         bib.items = sorted_items
         return bib
 
+    def __key_for(self, attr):
+        """Sort key reading the cached attribute directly, so sorting does not
+        need a Python level call per item.
+        """
+        if attr == 'title':
+            return operator.attrgetter('_title')
+        elif attr == 'author':
+            return operator.attrgetter('_author')
+        elif attr == 'year':
+            return operator.attrgetter('_year')
+        raise ValueError('{} is not a valid attr argument.'.format(attr))
+
     def write_to_file(self, filepath, header=''):
-        with open('results/'+filepath, 'w', encoding='utf-8') as f:
-            length = str(len(self))
-            f.write(header + ' (' + length + ')\n\n')
-            f.write(str(self))
+        with open(os.path.join('results', filepath), 'w', encoding='utf-8') as f:
+            f.write('{} ({})\n\n'.format(header, len(self)))
+            # Write item by item instead of building str(self) in memory.
+            for i, item in enumerate(self.items):
+                if i:
+                    f.write('\n')
+                f.write(str(item))
 
 
 def main():
-    import sys
-
     a = 'gesammelte.txt' if len(sys.argv) != 3 else sys.argv[1]
     b = 'neu_tib_gvk_swb.txt' if len(sys.argv) != 3 else sys.argv[2]
 